@@ -21,6 +21,9 @@ ERROR_KEYWORDS = [
     "FATAL",
 ]
 
+# Max log lines read per container per scan (caps work when a container floods its logs)
+LOG_TAIL_LINES = 2000
+
 # Kernel/I/O error keywords for dmesg
 KERNEL_ERROR_KEYWORDS = [
     "i/o error",
@@ -36,5 +39,17 @@ KERNEL_ERROR_KEYWORDS = [
     "timeout",
 ]
 
-# Loop interval in seconds (how often to check containers)
+# Loop interval in seconds (how often to check container status, health, CPU and RAM)
 LOOP_INTERVAL = int(os.environ.get("LOOP_INTERVAL", "300"))  # default 5 minutes
+
+# Per-check intervals in seconds for checks that need a different cadence
+LOG_INTERVAL = int(os.environ.get("LOG_INTERVAL", "60"))  # container log scan
+KERNEL_INTERVAL = int(os.environ.get("KERNEL_INTERVAL", "60"))  # dmesg I/O errors
+DISK_INTERVAL = int(os.environ.get("DISK_INTERVAL", "600"))  # container disk size
+UPDATES_INTERVAL = int(os.environ.get("UPDATES_INTERVAL", "3600"))  # apt updates count
+UPDATES_WATCH_INTERVAL = int(os.environ.get("UPDATES_WATCH_INTERVAL", "60"))  # apt state change poll (inotify)
+
+# apt updates count: re-checked when these host dirs change (needs inotify_simple),
+# and at least this often regardless
+APT_WATCH_DIRS = ["/host/var/lib/apt/lists", "/host/var/lib/dpkg"]
+UPDATES_FALLBACK_INTERVAL = 24 * 60 * 60
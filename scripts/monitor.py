@@ -4,17 +4,38 @@ Server monitoring: Docker container logs, disk, health, system updates, kernel I
 Publishes to MQTT. Subscribes to server/updates/trigger for apt upgrade.
 """
 
+import atexit
 import json
 import os
 import re
+import sched
+import signal
+import socket
 import subprocess
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import docker
 import paho.mqtt.client as mqtt
 
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
 from config import (
     MQTT_HOST,
     MQTT_PORT,
@@ -24,18 +45,60 @@ from config import (
     ERROR_KEYWORDS,
     KERNEL_ERROR_KEYWORDS,
     LOOP_INTERVAL,
+    LOG_INTERVAL,
+    LOG_TAIL_LINES,
+    KERNEL_INTERVAL,
+    DISK_INTERVAL,
+    UPDATES_INTERVAL,
+    UPDATES_WATCH_INTERVAL,
+    UPDATES_FALLBACK_INTERVAL,
+    APT_WATCH_DIRS,
 )
 
+# Compiled once at import; these run against every log / dmesg line
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m|D\[[0-9;]*m|\[\d+m')
+# Byte pattern: raw log output is searched before any decoding
+_ERROR_RE = re.compile(b"|".join(re.escape(kw.encode()) for kw in ERROR_KEYWORDS), re.IGNORECASE)
+# Level classification in one pass; the named group says which class matched
+_LEVEL_RE = re.compile(
+    r'(?P<warn>\bWARN(?:ING)?\b|\bWRN\b|level[=:]warn|\[WARN)'
+    r'|(?P<crit>\bCRITICAL\b|\bFATAL\b|level[=:]critical|"level"\s*:\s*"critical")',
+    re.IGNORECASE,
+)
+# Kernel keywords are matched case-sensitively (the list carries its own case variants)
+_KERNEL_RE = re.compile("|".join(re.escape(kw) for kw in KERNEL_ERROR_KEYWORDS))
+
 # MQTT client
 client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
 if MQTT_USER:
     client.username_pw_set(MQTT_USER, MQTT_PASSWORD if MQTT_PASSWORD else None)
+client.reconnect_delay_set(min_delay=1, max_delay=30)
 client.connect(MQTT_HOST, MQTT_PORT, 60)
+
+
+def enable_nagle():
+    """Turn Nagle back on (paho sets TCP_NODELAY) so bursts of small publishes share packets."""
+    sock = client.socket()
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+
+
+enable_nagle()
 client.loop_start()
 
 # Docker client
 docker_client = docker.from_env()
 
+# Long-lived ubuntu container that check_updates execs into (read-only host mount)
+APT_HELPER_NAME = "server_monitor_apt"
+apt_helper = None
+# inotify watch on the host's apt lists / dpkg state, and when check_updates last ran
+apt_watch = None
+last_updates_check = None
+updates_pending = False
+# Last count a successful check_updates found (None until one succeeds)
+last_updates_count = None
+
 # Update trigger flag
 update_triggered = False
 
@@ -44,6 +107,31 @@ discovered_containers = set()
 discovery_published = False
 # Track containers that have had errors (so we don't overwrite with NONE)
 containers_with_errors = set()
+# Kernel errors seen by the dmesg follower thread (last 10 kept, all counted)
+kernel_errors = deque(maxlen=10)
+kernel_error_count = 0
+dmesg_thread = None
+# Restart backoff for the dmesg follower: consecutive quick exits and when to try again
+dmesg_failures = 0
+dmesg_retry_at = 0.0
+DMESG_QUICK_EXIT = 10
+DMESG_MAX_BACKOFF = 3600
+# Combined per-container sensor values, published as one JSON document per container
+container_states: dict[str, dict] = {}
+# Shared container listing so checks that run together make one API call
+container_snapshot = None
+container_snapshot_time = 0.0
+SNAPSHOT_TTL = 10
+# Per-container log cursor (epoch seconds) so each loop only reads new lines
+_log_cursor: dict[str, float] = {}
+# Last payload sent per topic; cleared on disconnect so state is re-sent after reconnect
+_last_published: dict[str, str | bytes] = {}
+# Checks run in worker threads; these guard the state they share
+publish_lock = threading.Lock()
+state_lock = threading.Lock()
+snapshot_lock = threading.Lock()
+# Latest Future per check, so a check never overlaps with its own previous run
+check_futures = {}
 
 DEVICE_INFO = {
     "identifiers": ["server_monitor"],
@@ -53,11 +141,35 @@ DEVICE_INFO = {
 }
 
 
+def _container_sensor(suffix: str, label: str, icon: str, unit: str | None = None, tpl: str | None = None):
+    """Build one container sensor's name-independent discovery fields."""
+    # Fields a check hasn't reported yet are absent; .get() renders them as None (unknown in HA)
+    config = {"value_template": tpl or f"{{{{ value_json.get('{suffix}') }}}}", "icon": icon}
+    if unit:
+        config["unit_of_measurement"] = unit
+    return suffix, label, config
+
+
+# Per-container HA sensors; only name/state_topic/unique_id vary per container
+CONTAINER_SENSORS = (
+    _container_sensor("status", "Status", "mdi:docker"),
+    _container_sensor("health", "Health", "mdi:heart-pulse"),
+    _container_sensor("cpu_percent", "CPU", "mdi:cpu-64-bit", "%"),
+    _container_sensor("mem_percent", "Memory", "mdi:memory", "%"),
+    _container_sensor("mem_usage", "Memory Usage", "mdi:memory"),
+    _container_sensor("disk_size", "Disk Size", "mdi:harddisk"),
+    _container_sensor("restart_count", "Restarts", "mdi:restart"),
+    _container_sensor("error_count", "Errors", "mdi:alert-circle"),
+    _container_sensor("last_error", "Last Error", "mdi:alert", tpl="{% set e = value_json.get('last_error') or {} %}{{ e.msg[:200] if e.msg and e.msg != 'none' else 'none' }}"),
+    _container_sensor("last_error_level", "Error Level", "mdi:alert-octagram"),
+)
+
+
 def publish_discovery(component: str, object_id: str, config: dict):
     """Publish Home Assistant MQTT discovery config."""
     topic = f"homeassistant/{component}/{object_id}/config"
     config["device"] = DEVICE_INFO
-    client.publish(topic, json.dumps(config), retain=True)
+    client.publish(topic, _dumps(config), qos=0, retain=True)
 
 
 def publish_container_discovery(name: str):
@@ -67,32 +179,17 @@ def publish_container_discovery(name: str):
     discovered_containers.add(name)
     
     safe_name = name.replace("-", "_").replace(".", "_")
+    state_topic = f"{TOPIC_PREFIX}/containers/{name}/state"
     
-    sensors = [
-        ("status", "Status", None, "mdi:docker", None),
-        ("health", "Health", None, "mdi:heart-pulse", None),
-        ("cpu_percent", "CPU", "%", "mdi:cpu-64-bit", None),
-        ("mem_percent", "Memory", "%", "mdi:memory", None),
-        ("mem_usage", "Memory Usage", None, "mdi:memory", None),
-        ("disk_size", "Disk Size", None, "mdi:harddisk", None),
-        ("restart_count", "Restarts", None, "mdi:restart", None),
-        ("error_count", "Errors", None, "mdi:alert-circle", None),
-        ("last_error", "Last Error", None, "mdi:alert", "{{ value_json.msg[:200] if value_json.msg and value_json.msg != 'none' else 'none' }}"),
-        ("last_error_level", "Error Level", None, "mdi:alert-octagram", None),
-    ]
-    
-    for suffix, label, unit, icon, tpl in sensors:
+    # All sensors read from the one combined state document
+    for suffix, label, static_config in CONTAINER_SENSORS:
         object_id = f"container_{safe_name}_{suffix}"
         config = {
             "name": f"{name} {label}",
-            "state_topic": f"{TOPIC_PREFIX}/containers/{name}/{suffix}",
+            "state_topic": state_topic,
             "unique_id": object_id,
-            "icon": icon,
+            **static_config,
         }
-        if unit:
-            config["unit_of_measurement"] = unit
-        if tpl:
-            config["value_template"] = tpl
         publish_discovery("sensor", object_id, config)
 
 
@@ -138,175 +235,310 @@ def publish_system_discovery():
     mqtt_publish("system/io_error_count", 0)
 
 
-def mqtt_publish(topic: str, payload: str | int | dict):
-    """Publish to MQTT."""
-    if isinstance(payload, dict):
-        payload = json.dumps(payload)
-    elif isinstance(payload, int):
+def mqtt_publish(topic: str, payload: str | int | float | dict | list):
+    """Publish to MQTT (retained), skipping values identical to the last one sent."""
+    if isinstance(payload, (dict, list)):
+        payload = _dumps(payload)
+    elif isinstance(payload, (int, float)):
         payload = str(payload)
-    client.publish(f"{TOPIC_PREFIX}/{topic}", payload, retain=True)
+    with publish_lock:
+        if _last_published.get(topic) == payload:
+            return
+        result = client.publish(f"{TOPIC_PREFIX}/{topic}", payload, qos=0, retain=True)
+        if result.rc == mqtt.MQTT_ERR_SUCCESS:
+            _last_published[topic] = payload
+        else:
+            # QoS 0 publishes are only refused when not connected; left uncached so the next check re-sends it
+            _last_published.pop(topic, None)
+            print(f"MQTT publish to {topic} dropped: {mqtt.error_string(result.rc)}", file=sys.stderr)
+
+
+def update_container_state(name: str, **fields):
+    """Merge sensor values into a container's combined state (published by publish_container_states)."""
+    with state_lock:
+        container_states.setdefault(name, {}).update(fields)
+
+
+def publish_container_states():
+    """Publish one combined JSON state document per container."""
+    # Hold a container back until check_container_health has reported its status, so a
+    # running container is never published (and retained) with a made-up status
+    with state_lock:
+        states = [(name, dict(state)) for name, state in container_states.items() if "status" in state]
+    for name, state in states:
+        mqtt_publish(f"containers/{name}/state", state)
+
+
+def container_name(c: dict) -> str:
+    """Name of a container entry from docker_client.api.containers()."""
+    return c["Names"][0].lstrip("/")
 
 
 def get_containers():
-    """Auto-discover all containers (including stopped)."""
-    try:
-        return [c.name for c in docker_client.containers.list(all=True)]
-    except Exception as e:
-        print(f"Error listing containers: {e}", file=sys.stderr)
-        return []
+    """Auto-discover all containers (including stopped) as raw API entries (Id, Names, State, ...)."""
+    global container_snapshot, container_snapshot_time
+    with snapshot_lock:
+        now = time.monotonic()
+        if container_snapshot is not None and now - container_snapshot_time < SNAPSHOT_TTL:
+            return container_snapshot
+        try:
+            container_snapshot = docker_client.api.containers(all=True)
+            container_snapshot_time = now
+            return container_snapshot
+        except Exception as e:
+            print(f"Error listing containers: {e}", file=sys.stderr)
+            return []
 
 
 def check_container_logs():
     """Scan docker logs for errors, publish to MQTT."""
-    for name in get_containers():
+    for c in get_containers():
+        name = container_name(c)
         publish_container_discovery(name)
+        now = time.time()
+        since = _log_cursor.get(name, now - LOG_INTERVAL)
         try:
-            container = docker_client.containers.get(name)
-            logs = container.logs(since=300, stderr=True, stdout=True).decode(errors="replace")
+            # Left as bytes: only the few lines that match a keyword get decoded
+            logs = docker_client.api.logs(
+                c["Id"], since=since, until=now, tail=LOG_TAIL_LINES, stderr=True, stdout=True, timestamps=True
+            )
         except Exception as e:
-            mqtt_publish(f"containers/{name}/last_error", {"level": "ERROR", "msg": str(e)})
+            update_container_state(name, last_error={"level": "ERROR", "msg": str(e)})
             continue
 
-        errors = []
-        for line in logs.splitlines():
-            line = line.strip()
-            if not line:
-                continue
+        # Only the last few errors are published; keep those plus a running count
+        errors = deque(maxlen=5)
+        error_count = 0
+        pos = 0
+        while match := _ERROR_RE.search(logs, pos):
+            start = logs.rfind(b"\n", 0, match.start()) + 1
+            end = logs.find(b"\n", match.end())
+            if end == -1:
+                end = len(logs)
+            pos = end + 1
+
+            # timestamps=True prefixes each line with an RFC3339 timestamp
+            timestamp, _, line = logs[start:end].decode(errors="replace").strip().partition(" ")
             # Strip ANSI color codes for cleaner matching and display
-            clean_line = re.sub(r'\x1b\[[0-9;]*m|D\[[0-9;]*m|\[\d+m', '', line)
-            
-            matched = False
+            clean_line = _ANSI_RE.sub('', line.strip())
+
+            # Skip warnings - only keep ERROR and CRITICAL (a warning marker anywhere wins)
             level = "ERROR"
-            for kw in ERROR_KEYWORDS:
-                if kw.lower() in clean_line.lower():
-                    matched = True
+            for level_match in _LEVEL_RE.finditer(clean_line):
+                if level_match.lastgroup == "warn":
                     break
-            
-            if not matched:
-                continue
-                
-            # Skip warnings - only keep ERROR and CRITICAL
-            if re.search(r'\bWARN(ING)?\b|\bWRN\b|level[=:]warn|\[WARN', clean_line, re.I):
-                continue
-            
-            # Determine level - check CRITICAL first
-            if re.search(r'\bCRITICAL\b|\bFATAL\b|level[=:]critical|"level"\s*:\s*"critical"', clean_line, re.I):
                 level = "CRITICAL"
-            elif re.search(r'\bERROR\b|level[=:]error|"level"\s*:\s*"error"|Exception|Traceback', clean_line, re.I):
-                level = "ERROR"
-            
-            errors.append({"level": level, "msg": clean_line[:500], "timestamp": datetime.now(timezone.utc).isoformat()})
+            else:
+                error_count += 1
+                errors.append({"level": level, "msg": clean_line[:500], "timestamp": timestamp})
 
-        mqtt_publish(f"containers/{name}/error_count", len(errors))
+        update_container_state(name, error_count=error_count)
         if errors:
             containers_with_errors.add(name)
-            mqtt_publish(f"containers/{name}/last_error", {"level": errors[-1]["level"], "msg": errors[-1]["msg"]})
-            mqtt_publish(f"containers/{name}/last_error_level", errors[-1]["level"])
-            mqtt_publish(f"containers/{name}/errors", json.dumps(errors[-5:]))
+            update_container_state(
+                name,
+                last_error={"level": errors[-1]["level"], "msg": errors[-1]["msg"]},
+                last_error_level=errors[-1]["level"],
+            )
+            mqtt_publish(f"containers/{name}/errors", list(errors))
         elif name not in containers_with_errors:
             # Only publish NONE if container has never had errors (don't overwrite persisted errors)
-            mqtt_publish(f"containers/{name}/last_error", {"level": "NONE", "msg": "none"})
-            mqtt_publish(f"containers/{name}/last_error_level", "NONE")
+            update_container_state(name, last_error={"level": "NONE", "msg": "none"}, last_error_level="NONE")
+        _log_cursor[name] = now
+
+
+def _human_size(
+    size: float, base: int = 1000, units=("B", "kB", "MB", "GB", "TB", "PB"), precision: int = 3
+) -> str:
+    """Format a byte count like docker ps -s does (3 significant digits, e.g. "1.16MB")."""
+    i = 0
+    while size >= base and i < len(units) - 1:
+        size /= base
+        i += 1
+    return f"{size:.{precision}g}{units[i]}"
+
+
+def _binary_size(size: float) -> str:
+    """Format a byte count in binary units like docker stats (4 significant digits, e.g. "12.55MiB")."""
+    return _human_size(size, 1024, ("B", "KiB", "MiB", "GiB", "TiB", "PiB"), precision=4)
 
 
 def check_container_disk():
-    """Get per-container disk size via docker ps -s (run docker:cli container), publish to MQTT."""
+    """Get per-container disk size (writable layer) from the Docker API, publish to MQTT."""
     try:
-        result = docker_client.containers.run(
-            "docker:cli",
-            ["docker", "ps", "-a", "-s", "--format", "{{.Names}} {{.Size}}"],
-            remove=True,
-            volumes={"/var/run/docker.sock": {"bind": "/var/run/docker.sock", "mode": "rw"}},
-            user="root",
-            detach=False,
-        )
-        stdout = result.decode() if isinstance(result, bytes) else result
+        containers = docker_client.api.containers(all=True, size=True)
     except Exception as e:
         print(f"Error getting container disk: {e}", file=sys.stderr)
         return
 
-    for line in stdout.strip().splitlines():
-        parts = line.strip().split(" ", 1)
-        if len(parts) != 2:
-            continue
-        name, size_info = parts
-        # size_info is like "1.16MB (virtual 155MB)" - use first value
-        disk_size = size_info.split()[0] if size_info else "0B"
-        mqtt_publish(f"containers/{name}/disk_size", disk_size)
+    for c in containers:
+        update_container_state(container_name(c), disk_size=_human_size(c.get("SizeRw") or 0))
 
 
-def check_container_stats():
-    """Publish per-container CPU and RAM (Glances containers plugin returns empty)."""
+def _container_stats(c: dict):
+    """Fetch one stats sample for a container; returns (name, stats) or (name, None) on error."""
+    name = container_name(c)
     try:
-        result = docker_client.containers.run(
-            "docker:cli",
-            [
-                "docker", "stats", "--no-stream", "--format",
-                "{{.Name}}\t{{.CPUPerc}}\t{{.MemPerc}}\t{{.MemUsage}}"
-            ],
-            remove=True,
-            volumes={"/var/run/docker.sock": {"bind": "/var/run/docker.sock", "mode": "rw"}},
-            user="root",
-            detach=False,
-        )
-        stdout = result.decode() if isinstance(result, bytes) else result
+        return name, docker_client.api.stats(c["Id"], stream=False)
     except Exception as e:
-        print(f"Error getting container stats: {e}", file=sys.stderr)
-        return
-    for line in stdout.strip().splitlines():
-        parts = line.strip().split("\t")
-        if len(parts) < 4:
+        print(f"Error getting stats for {name}: {e}", file=sys.stderr)
+        return name, None
+
+
+def check_container_stats():
+    """Publish per-container CPU and RAM (Glances containers plugin returns empty)."""
+    running = [c for c in get_containers() if c.get("State") == "running"]
+
+    # Each stats call blocks ~1s server-side while Docker samples CPU; run them concurrently
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        results = list(ex.map(_container_stats, running))
+
+    for name, stats in results:
+        if not stats:
             continue
-        name, cpu_pct, mem_pct, mem_usage = parts[0], parts[1], parts[2], parts[3]
-        cpu_pct = cpu_pct.rstrip("%") or "0"
-        mem_pct = mem_pct.rstrip("%") or "0"
-        mqtt_publish(f"containers/{name}/cpu_percent", float(cpu_pct) if cpu_pct.replace(".", "").isdigit() else 0)
-        mqtt_publish(f"containers/{name}/mem_percent", float(mem_pct) if mem_pct.replace(".", "").isdigit() else 0)
-        mqtt_publish(f"containers/{name}/mem_usage", mem_usage)
+        # Same formulas as the docker CLI (cli/command/container/stats_helpers.go)
+        cpu = stats.get("cpu_stats", {})
+        precpu = stats.get("precpu_stats", {})
+        cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+        system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+        online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+        cpu_pct = cpu_delta / system_delta * online_cpus * 100 if cpu_delta > 0 and system_delta > 0 else 0.0
+
+        mem = stats.get("memory_stats", {})
+        mem_detail = mem.get("stats", {})
+        # Exclude page cache: cgroup v1 reports total_inactive_file, v2 inactive_file
+        mem_cache = mem_detail.get("total_inactive_file", mem_detail.get("inactive_file", 0))
+        mem_used = max(mem.get("usage", 0) - mem_cache, 0)
+        mem_limit = mem.get("limit", 0)
+        mem_pct = mem_used / mem_limit * 100 if mem_limit else 0.0
+
+        update_container_state(
+            name,
+            cpu_percent=round(cpu_pct, 2),
+            mem_percent=round(mem_pct, 2),
+            mem_usage=f"{_binary_size(mem_used)} / {_binary_size(mem_limit)}",
+        )
+
+
+def _inspect_state(container_id: str):
+    """Return the State block of a container inspect, or None on error."""
+    try:
+        return docker_client.api.inspect_container(container_id)["State"]
+    except Exception:
+        return None
 
 
 def check_container_health():
     """Publish container status (up/down), health (healthy/unhealthy), and restart count."""
     try:
-        for c in docker_client.containers.list(all=True):
-            name = c.name
-            try:
-                inspect = docker_client.api.inspect_container(c.id)
-                state = inspect["State"]
+        containers = get_containers()
+        # RestartCount is only in inspect; issue the per-container inspects concurrently
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            states = list(ex.map(_inspect_state, [c["Id"] for c in containers]))
+        for c, state in zip(containers, states):
+            name = container_name(c)
+            if state:
                 raw_status = state.get("Status", "unknown")
                 status = "up" if raw_status == "running" else "down"
                 health = state.get("Health", {}).get("Status", "none")
                 if health not in ("healthy", "unhealthy", "starting"):
                     health = "none"
                 restart_count = state.get("RestartCount", 0)
-            except Exception:
+            else:
                 status = "down"
                 health = "none"
                 restart_count = 0
-            mqtt_publish(f"containers/{name}/status", status)
-            mqtt_publish(f"containers/{name}/health", health)
-            mqtt_publish(f"containers/{name}/restart_count", restart_count)
+            update_container_state(name, status=status, health=health, restart_count=restart_count)
     except Exception as e:
         print(f"Error checking container health: {e}", file=sys.stderr)
 
 
-def check_updates():
-    """Run apt list --upgradable via chroot, publish count."""
+def get_apt_helper():
+    """Return the long-lived ubuntu container used for apt queries, starting it if needed."""
+    global apt_helper
+    if apt_helper is not None:
+        try:
+            apt_helper.reload()
+            if apt_helper.status == "running":
+                return apt_helper
+        except docker.errors.NotFound:
+            pass
+
+    # Clear out a helper left behind by a previous run before starting a fresh one
     try:
-        result = docker_client.containers.run(
-            "ubuntu:22.04",
+        docker_client.containers.get(APT_HELPER_NAME).remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    apt_helper = docker_client.containers.run(
+        "ubuntu:22.04",
+        ["sleep", "infinity"],
+        name=APT_HELPER_NAME,
+        remove=True,
+        volumes={"/": {"bind": "/host", "mode": "ro"}},
+        network_mode="host",
+        user="root",
+        detach=True,
+    )
+    return apt_helper
+
+
+def stop_apt_helper():
+    """Stop (and thereby remove) the apt helper container."""
+    if apt_helper is None:
+        return
+    try:
+        apt_helper.stop(timeout=1)
+    except Exception:
+        pass
+
+
+def check_updates() -> bool:
+    """Run apt list --upgradable via chroot in the helper container, publish count. Returns False on error."""
+    global last_updates_count
+    try:
+        result = get_apt_helper().exec_run(
             ["bash", "-c", "chroot /host apt list --upgradable 2>/dev/null | grep -c upgradable || true"],
-            remove=True,
-            volumes={"/": {"bind": "/host", "mode": "ro"}},
-            network_mode="host",
-            user="root",
-            detach=False,
         )
-        count = int(result.decode().strip().splitlines()[-1] if result else 0)
+        count = int(result.output.decode().strip().splitlines()[-1] if result.output else 0)
     except Exception as e:
+        # Leave the last real count in place rather than publishing a made-up 0
         print(f"Error checking updates: {e}", file=sys.stderr)
-        count = 0
+        return False
+    last_updates_count = count
     mqtt_publish("updates/count", count)
+    return True
+
+
+def watch_apt_state():
+    """Watch the host's apt/dpkg state dirs with inotify; returns None if that isn't possible."""
+    if INotify is None:
+        return None
+    try:
+        watch = INotify()
+        for path in APT_WATCH_DIRS:
+            watch.add_watch(path, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        return watch
+    except OSError as e:
+        print(f"Error watching apt state, falling back to polling: {e}", file=sys.stderr)
+        return None
+
+
+def check_updates_on_change():
+    """Run check_updates only when apt lists / dpkg status changed, or after the fallback interval."""
+    global last_updates_check, updates_pending
+    if apt_watch.read(timeout=0):
+        # read() consumes the events, so remember the change until a check succeeds
+        updates_pending = True
+    now = time.monotonic()
+    if updates_pending or last_updates_check is None or now - last_updates_check >= UPDATES_FALLBACK_INTERVAL:
+        # Only a successful run clears the change; a failed one is retried on the next poll
+        if check_updates():
+            last_updates_check = now
+            updates_pending = False
+    if last_updates_count is not None:
+        # Re-send every poll (free via the dedup cache) so the count is restored after
+        # a reconnect clears it, instead of waiting for the next apt change
+        mqtt_publish("updates/count", last_updates_count)
 
 
 def run_apt_upgrade():
@@ -332,35 +564,60 @@ def run_apt_upgrade():
         mqtt_publish("updates/status", f"failed: {str(e)[:200]}")
 
 
-def check_kernel_errors():
-    """Run dmesg, grep for I/O/NVMe errors, publish to MQTT."""
+def _dmesg_failed(reason: str, started: float):
+    """Log why the dmesg follower stopped and back off before it is restarted."""
+    global dmesg_failures, dmesg_retry_at
+    # A follower that dies right away (e.g. no CAP_SYSLOG / dmesg_restrict) will keep doing so
+    dmesg_failures = dmesg_failures + 1 if time.monotonic() - started < DMESG_QUICK_EXIT else 1
+    delay = min(KERNEL_INTERVAL * 2 ** (dmesg_failures - 1), DMESG_MAX_BACKOFF)
+    dmesg_retry_at = time.monotonic() + delay
+    print(f"dmesg follower stopped ({reason}); retrying in {delay}s", file=sys.stderr)
+
+
+def _dmesg_reader():
+    """Follow dmesg and collect lines matching KERNEL_ERROR_KEYWORDS."""
+    global kernel_error_count
+    started = time.monotonic()
     try:
-        result = subprocess.run(
-            ["dmesg", "-T"],
-            capture_output=True,
+        proc = subprocess.Popen(
+            ["dmesg", "-Tw"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=10,
+            errors="replace",
         )
     except Exception as e:
-        print(f"Error running dmesg: {e}", file=sys.stderr)
-        mqtt_publish("system/io_error_count", 0)
+        _dmesg_failed(f"error running dmesg: {e}", started)
         return
 
-    if result.returncode != 0:
-        mqtt_publish("system/io_error_count", 0)
-        return
+    for line in proc.stdout:
+        if _KERNEL_RE.search(line):
+            kernel_error_count += 1
+            kernel_errors.append({"msg": line.rstrip()[:500], "timestamp": datetime.now(timezone.utc).isoformat()})
+    stderr = proc.stderr.read().strip()
+    proc.wait()
+    _dmesg_failed(f"exit code {proc.returncode}: {stderr or 'no error output'}", started)
 
-    matches = []
-    for line in result.stdout.splitlines():
-        for kw in KERNEL_ERROR_KEYWORDS:
-            if kw in line:
-                matches.append({"msg": line[:500], "timestamp": datetime.now(timezone.utc).isoformat()})
-                break
 
-    mqtt_publish("system/io_error_count", len(matches))
+def start_dmesg_reader():
+    """Start the background dmesg follower (it replays the ring buffer, so counts start fresh)."""
+    global dmesg_thread, kernel_error_count
+    kernel_errors.clear()
+    kernel_error_count = 0
+    dmesg_thread = threading.Thread(target=_dmesg_reader, daemon=True)
+    dmesg_thread.start()
+
+
+def check_kernel_errors():
+    """Publish I/O/NVMe errors collected by the dmesg follower thread."""
+    if (dmesg_thread is None or not dmesg_thread.is_alive()) and time.monotonic() >= dmesg_retry_at:
+        start_dmesg_reader()
+
+    matches = list(kernel_errors)
+    mqtt_publish("system/io_error_count", kernel_error_count)
     if matches:
         mqtt_publish("system/last_io_error", matches[-1])
-        mqtt_publish("system/kernel_errors", json.dumps(matches[-10:]))
+        mqtt_publish("system/kernel_errors", matches)
 
 
 def on_message(_, userdata, msg):
@@ -372,30 +629,80 @@ def on_message(_, userdata, msg):
             update_triggered = True
 
 
+def on_connect(_, userdata, flags, reason_code, properties):
+    """Re-apply socket options after paho (re)connects."""
+    enable_nagle()
+
+
+def on_disconnect(_, userdata, flags, reason_code, properties):
+    """Forget published state so every sensor is re-sent after reconnecting."""
+    with publish_lock:
+        _last_published.clear()
+
+
 client.subscribe(f"{TOPIC_PREFIX}/updates/trigger")
 client.on_message = on_message
+client.on_connect = on_connect
+client.on_disconnect = on_disconnect
 
 
-def main():
+def check_update_trigger():
+    """Run apt upgrade if it was requested over MQTT."""
     global update_triggered
+    if update_triggered:
+        update_triggered = False
+        run_apt_upgrade()
+
+
+def run_check(check, publishes_states: bool):
+    """Run a check, then publish container state if it is one of the container checks."""
+    try:
+        check()
+        if publishes_states:
+            publish_container_states()
+    except Exception as e:
+        print(f"Error in {check.__name__}: {e}", file=sys.stderr)
+
+
+def schedule_repeat(scheduler: sched.scheduler, executor: ThreadPoolExecutor, check, interval: int, publishes_states: bool):
+    """Hand a check to the worker pool and schedule its next run."""
+    # Skip this run if the previous one is still going rather than piling up
+    running = check_futures.get(check)
+    if running is None or running.done():
+        check_futures[check] = executor.submit(run_check, check, publishes_states)
+    else:
+        print(f"{check.__name__} still running, skipping this run", file=sys.stderr)
+    scheduler.enter(interval, 1, schedule_repeat, (scheduler, executor, check, interval, publishes_states))
+
+
+def main():
+    global apt_watch
     print("Monitor started. Loop interval:", LOOP_INTERVAL, "seconds")
     publish_system_discovery()
-    while True:
-        try:
-            if update_triggered:
-                update_triggered = False
-                run_apt_upgrade()
-
-            check_container_logs()
-            check_container_disk()
-            check_container_stats()
-            check_container_health()
-            check_updates()
-            check_kernel_errors()
-        except Exception as e:
-            print(f"Loop error: {e}", file=sys.stderr)
-
-        time.sleep(LOOP_INTERVAL)
+    start_dmesg_reader()
+    # docker stop sends SIGTERM; exit normally so atexit removes the apt helper
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    atexit.register(stop_apt_helper)
+    apt_watch = watch_apt_state()
+
+    # Each check runs on its own cadence, in its own worker thread, so slow checks
+    # (Docker socket / subprocess I/O) don't hold up the rest.
+    # (check, interval, whether it updates container state and should publish it afterwards)
+    checks = (
+        (check_update_trigger, 5, False),
+        (check_container_logs, LOG_INTERVAL, True),
+        (check_container_disk, DISK_INTERVAL, True),
+        (check_container_stats, LOOP_INTERVAL, True),
+        (check_container_health, LOOP_INTERVAL, True),
+        # Cheap inotify poll when available, plain polling of the apt check otherwise
+        (check_updates_on_change, UPDATES_WATCH_INTERVAL, False) if apt_watch else (check_updates, UPDATES_INTERVAL, False),
+        (check_kernel_errors, KERNEL_INTERVAL, False),
+    )
+    executor = ThreadPoolExecutor(max_workers=len(checks))
+    scheduler = sched.scheduler(time.monotonic, time.sleep)
+    for check, interval, publishes_states in checks:
+        scheduler.enter(0, 1, schedule_repeat, (scheduler, executor, check, interval, publishes_states))
+    scheduler.run()
 
 
 if __name__ == "__main__":